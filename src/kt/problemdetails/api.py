@@ -3,8 +3,11 @@ Serialization support for RFC 7807 Problem Details.
 
 """
 
+import hashlib
 import json
 import logging
+import threading
+import weakref
 import xml.sax.saxutils
 
 import flask
@@ -21,6 +24,18 @@ CONTENT_TYPE_JSON = CONTENT_TYPE_BASE + '+json'
 CONTENT_TYPE_XML = CONTENT_TYPE_BASE + '+xml'
 """Media type for XML-encoded problem details."""
 
+CONTENT_TYPE_BATCH_JSON = 'application/json'
+"""Media type for JSON-encoded batches of problem details."""
+
+CONTENT_TYPE_BATCH_XML = 'application/xml'
+"""Media type for XML-encoded batches of problem details."""
+
+STANDARD_FIELDS = ('type', 'title', 'status', 'detail', 'instance')
+"""Names of fields defined by :rfc:`7807`, in specification order."""
+
+STATIC_FIELDS = ('type', 'title', 'status')
+"""Standard fields usually shared by all problems of the same type."""
+
 logger = logging.getLogger(__name__)
 
 
@@ -29,24 +44,26 @@ def as_dict(error):
 
     If no adaption to
     :class:`~kt.problemdetails.interfaces.IProblemDetails` is available,
-    a minimal problem details structure is generated.
+    a minimal problem details structure is generated from the
+    :class:`Fallback` for the class of *error*.
 
     """
-    err = kt.problemdetails.interfaces.IProblemDetails(error, None)
+    return _as_dict(error,
+                    kt.problemdetails.interfaces.IProblemDetails(error, None))
+
+
+def _as_dict(error, err):
     if err is None:
         # Use fallback for exceptions:
-        detail = str(error).strip()
-        title = (error.__class__.__doc__ or '').strip()
-        data = dict(
-            status=500,
-        )
-        if detail:
-            data['detail'] = detail
-        if title:
-            data['title'] = title
+        fallback = get_fallback(error.__class__)
+        data = dict(fallback.data)
+        if fallback.expose_detail:
+            detail = str(error).strip()
+            if detail:
+                data['detail'] = detail
     else:
         data = dict(err.extensions())
-        for attr in ('type', 'title', 'status', 'detail', 'instance'):
+        for attr in STANDARD_FIELDS:
             if attr in data:
                 logger.warning(f'extensions should not contain key {attr!r}')
             value = getattr(err, attr, None)
@@ -55,6 +72,115 @@ def as_dict(error):
     return data
 
 
+class Fallback:
+    """Problem details for exceptions of a class without an adapter.
+
+    Instances are computed by :func:`get_fallback`.
+
+    """
+
+    __slots__ = ('type', 'title', 'status', 'expose_detail', 'data')
+
+    def __init__(self, type, title, status, expose_detail):
+        self.type = type
+        """Problem type reference, or ``None``."""
+
+        self.title = title
+        """Problem title, or ``None``."""
+
+        self.status = status
+        """HTTP status code."""
+
+        self.expose_detail = expose_detail
+        """Whether the string value of the exception is used as detail."""
+
+        self.data = {attr: value
+                     for attr, value in (('type', type), ('title', title),
+                                         ('status', status))
+                     if value}
+        """Problem details common to all exceptions of the class."""
+
+
+_fallbacks = {}
+_fallback_cache = weakref.WeakKeyDictionary()
+_fallback_generation = 0
+_fallback_lock = threading.Lock()
+
+
+def register_fallback(cls, *, type=None, title=None, status=None,
+                      expose_detail=None):
+    """Override fallback problem details for exception class *cls*.
+
+    Overrides apply to *cls* and its subclasses, unless a subclass has
+    its own registration for the same field.  Fields passed as ``None``
+    are not overridden.  Registering for :exc:`BaseException` defines
+    policy for all exceptions; for example, to avoid exposing exception
+    text from unadapted exceptions in production::
+
+        register_fallback(BaseException, expose_detail=False)
+
+    Registration replaces any previous registration for *cls*, and may be
+    changed while other threads are rendering problems.
+
+    """
+    overrides = dict(type=type, title=title, status=status,
+                     expose_detail=expose_detail)
+    overrides = {name: value for name, value in overrides.items()
+                 if value is not None}
+    _set_fallback(cls, overrides)
+
+
+def unregister_fallback(cls):
+    """Remove fallback overrides registered for exception class *cls*."""
+    _set_fallback(cls, None)
+
+
+def _set_fallback(cls, overrides):
+    global _fallback_generation
+    with _fallback_lock:
+        if overrides is None:
+            _fallbacks.pop(cls, None)
+        else:
+            _fallbacks[cls] = overrides
+        _fallback_generation += 1
+        _fallback_cache.clear()
+
+
+def get_fallback(cls):
+    """Return the :class:`Fallback` for exception class *cls*.
+
+    Each field is taken from the first registration for that field along
+    the method resolution order of *cls*.  Without a registration, the
+    title is taken from the docstring of *cls*, the status is 500, there
+    is no type, and detail is exposed.
+
+    The result is computed once per class and cached until the
+    registrations change.
+
+    """
+    fallback = _fallback_cache.get(cls)
+    if fallback is None:
+        generation = _fallback_generation
+        fields = dict(
+            type=None,
+            title=(cls.__doc__ or '').strip() or None,
+            status=500,
+            expose_detail=True,
+        )
+        for name in fields:
+            for base in cls.__mro__:
+                overrides = _fallbacks.get(base)
+                if overrides and name in overrides:
+                    fields[name] = overrides[name]
+                    break
+        fallback = Fallback(**fields)
+        with _fallback_lock:
+            # Don't cache if the registrations changed while computing.
+            if generation == _fallback_generation:
+                _fallback_cache[cls] = fallback
+    return fallback
+
+
 def render_json(error, headers=None):
     """Render error as application/problem+json.
 
@@ -63,13 +189,15 @@ def render_json(error, headers=None):
     **Content-Type** header is provided, it will be used instead of the
     default value for JSON problem detail responses.
 
+    If the problem details provide
+    :class:`~kt.problemdetails.interfaces.ICacheableProblemDetails`,
+    caching headers are added and conditional requests are answered as
+    described for :func:`render_xml`.
+
     Returns a Flask response.
 
     """
-    data = as_dict(error)
-    status = _get_status(data)
-    content = json.dumps(data, cls=flask.current_app.json_encoder)
-    return _response(data, content, status, headers, CONTENT_TYPE_JSON)
+    return _render(error, encode_json, CONTENT_TYPE_JSON, headers)
 
 
 def render_xml(error, headers=None):
@@ -80,18 +208,105 @@ def render_xml(error, headers=None):
     **Content-Type** header is provided, it will be used instead of the
     default value for XML problem detail responses.
 
+    If the problem details provide
+    :class:`~kt.problemdetails.interfaces.ICacheableProblemDetails`, the
+    response includes a strong **ETag**, and **Cache-Control** unless
+    that is provided in *headers*.  A ``GET`` or ``HEAD`` request with a
+    matching **If-None-Match** header receives a 304 (Not Modified)
+    response instead; if the problem details provide a version token,
+    the body is not encoded, and the reporter is not called.
+
+    Answering with 304 when the unconditional response would have an
+    error status deliberately departs from :rfc:`9110#section-13.2.1`,
+    which requires **If-None-Match** to be ignored for responses other
+    than 2xx.  Problem details should only opt in where clients and
+    caches are known to handle this.
+
     Returns a Flask response.
 
     """
-    data = as_dict(error)
-    status = _get_status(data)
-    content = [
+    return _render(error, encode_xml, CONTENT_TYPE_XML, headers)
+
+
+def _render(error, encode, content_type, headers):
+    hdrs = flask.app.Headers()
+    if headers is not None:
+        hdrs.extend(headers)
+    if 'Content-Type' not in hdrs:
+        hdrs['Content-Type'] = content_type
+    err = kt.problemdetails.interfaces.IProblemDetails(error, None)
+    iface = kt.problemdetails.interfaces.ICacheableProblemDetails
+    if not iface.providedBy(err):
+        problem = _prepare(error, err, encode, content_type,
+                           flask.current_app.json_encoder)
+        return flask.make_response(problem.content, problem.status, hdrs)
+
+    if 'Cache-Control' not in hdrs:
+        hdrs['Cache-Control'] = err.cache_control
+    token = getattr(err, 'etag', None)
+    if token:
+        # Distinct representations of the same problem need distinct
+        # entity tags, so the token is combined with the media type.
+        etag = _etag(f'{hdrs["Content-Type"]}\n{token}'.encode('utf-8'))
+        if _not_modified(etag):
+            return _not_modified_response(etag, hdrs)
+    problem = _prepare(error, err, encode, content_type,
+                       flask.current_app.json_encoder)
+    if not token:
+        etag = _etag(problem.content)
+        if _not_modified(etag):
+            return _not_modified_response(etag, hdrs)
+    response = flask.make_response(problem.content, problem.status, hdrs)
+    response.set_etag(etag)
+    return response
+
+
+def _etag(content):
+    return hashlib.sha256(content).hexdigest()[:32]
+
+
+def _not_modified(etag):
+    request = flask.request
+    return (request.method in ('GET', 'HEAD')
+            and request.if_none_match.contains_weak(etag))
+
+
+def _not_modified_response(etag, hdrs):
+    del hdrs['Content-Type']
+    response = flask.make_response(b'', 304, hdrs)
+    response.set_etag(etag)
+    return response
+
+
+def encode_json(data, json_encoder=None):
+    """Encode problem details mapping *data* as JSON.
+
+    *json_encoder* is passed to :func:`json.dumps` as the encoder class.
+
+    """
+    return json.dumps(data, cls=json_encoder)
+
+
+def encode_xml(data, json_encoder=None):
+    """Encode problem details mapping *data* as :rfc:`7807` XML.
+
+    *json_encoder* is used to reduce extension values to JSON-compatible
+    values before serializing them as XML.
+
+    """
+    return (
         '<?xml version="1.0" encoding="UTF-8"?>\n'
         '<problem xmlns="urn:ietf:rfc:7807">\n'
-    ]
-    have_data = False
+        + _xml_fields(data, json_encoder)
+        + '</problem>\n'
+    )
 
-    def serialize(name, value, indent='  '):
+
+def _xml_fields(data, json_encoder, indent='  ', have_data=False):
+    data = dict(data)
+    content = []
+
+    def serialize(name, value, indent):
         if isinstance(value, list):
             content.append(f'{indent}<{name}>\n')
             for val in value:
@@ -107,37 +322,258 @@ def render_xml(error, headers=None):
             content.append(f'{indent}<{name}>{value}</{name}>\n')
 
     # These are in the same order as defined in the specification.
-    for attr in ('type', 'title', 'status', 'detail', 'instance'):
+    for attr in STANDARD_FIELDS:
         if attr in data:
             have_data = True
             value = data.pop(attr)
-            serialize(attr, value)
+            serialize(attr, value, indent)
 
     # Ensure remaining bits are JSON-encodable, so that atypical
     # types are handled before applying RFC 7807 serialization
     # rules.
     if data:
-        cooked = json.dumps(data, cls=flask.current_app.json_encoder)
+        cooked = json.dumps(data, cls=json_encoder)
         data = json.loads(cooked)
         if have_data:
             content.append('\n')
 
         for name, value in data.items():
-            serialize(name, value)
+            serialize(name, value, indent)
+
+    return ''.join(content)
+
+
+def render_json_batch(errors, status=207, headers=None):
+    """Render many errors as a single JSON document.
+
+    The document is an object with a single ``problems`` key, containing
+    the problem details for each of *errors* in order.  The response is
+    streamed, so *errors* may be a lazily-evaluated iterable of any
+    length.  *status* is the HTTP status of the response as a whole.
+
+    If *headers* is given and non-``None``, it must be be mapping of
+    additional headers that should be returned in the request.  If a
+    **Content-Type** header is provided, it will be used instead of
+    ``application/json``.
+
+    Returns a Flask response.
+
+    """
+    fragments = _StaticFragments(
+        lambda data, json_encoder: json.dumps(data, cls=json_encoder)[1:-1])
+
+    def encode(data, json_encoder):
+        static, data = fragments.split(data, json_encoder)
+        parts = [static] if static else []
+        if data:
+            parts.append(json.dumps(data, cls=json_encoder)[1:-1])
+        return '{' + ', '.join(parts) + '}'
+
+    return _render_batch(errors, encode, CONTENT_TYPE_BATCH_JSON,
+                         '{"problems": [\n  ', ',\n  ', '\n]}\n',
+                         status, headers)
+
 
-    content.append('</problem>\n')
-    content = ''.join(content)
-    return _response(data, content, status, headers, CONTENT_TYPE_XML)
+def render_xml_batch(errors, status=207, headers=None):
+    """Render many errors as a single XML document.
 
+    The document has a ``problems`` root element containing a
+    ``problem`` element for each of *errors* in order.  The response is
+    streamed, so *errors* may be a lazily-evaluated iterable of any
+    length.  *status* is the HTTP status of the response as a whole.
+
+    If *headers* is given and non-``None``, it must be be mapping of
+    additional headers that should be returned in the request.  If a
+    **Content-Type** header is provided, it will be used instead of
+    ``application/xml``.
+
+    Returns a Flask response.
+
+    """
+    fragments = _StaticFragments(
+        lambda data, json_encoder: _xml_fields(data, json_encoder, '    '))
+
+    def encode(data, json_encoder):
+        static, data = fragments.split(data, json_encoder)
+        return (
+            '  <problem>\n'
+            + static
+            + _xml_fields(data, json_encoder, '    ', bool(static))
+            + '  </problem>\n'
+        )
+
+    return _render_batch(errors, encode, CONTENT_TYPE_BATCH_XML,
+                         '<?xml version="1.0" encoding="UTF-8"?>\n'
+                         '<problems xmlns="urn:ietf:rfc:7807">\n',
+                         '', '</problems>\n', status, headers)
+
+
+def _render_batch(errors, encode, ctype, head, separator, tail,
+                  status, headers):
+    json_encoder = flask.current_app.json_encoder
+    head = head.encode('utf-8')
+    separator = separator.encode('utf-8')
+    tail = tail.encode('utf-8')
+
+    def generate():
+        yield head
+        sep = b''
+        for error in errors:
+            err = kt.problemdetails.interfaces.IProblemDetails(error, None)
+            problem = _prepare(error, err, encode, ctype, json_encoder,
+                               batch=True)
+            yield sep + problem.content
+            sep = separator
+        yield tail
 
-def _response(data, content, status, headers, ctype):
-    content = content.encode('utf-8')
     hdrs = flask.app.Headers()
     if headers is not None:
         hdrs.extend(headers)
     if 'Content-Type' not in hdrs:
         hdrs['Content-Type'] = ctype
-    return flask.make_response(content, status, hdrs)
+    return flask.Response(flask.stream_with_context(generate()),
+                          status, hdrs)
+
+
+class _StaticFragments:
+    """Encoded static fields of problems, keyed by the field values.
+
+    Problems of the same type generally share type, title, and status,
+    so these are encoded once per distinct combination.  The number of
+    fragments retained is bounded, so memory use does not grow with the
+    number of problems encoded.
+
+    *encode* is called with the static fields and the JSON encoder class
+    passed to :meth:`split`, which must be the same for all problems.
+
+    """
+
+    maxsize = 256
+
+    def __init__(self, encode):
+        self.encode = encode
+        self.fragments = {}
+
+    def split(self, data, json_encoder=None):
+        """Return encoded static fields of *data* and remaining fields."""
+        static = {attr: data[attr] for attr in STATIC_FIELDS if attr in data}
+        others = {name: value for name, value in data.items()
+                  if name not in STATIC_FIELDS}
+        key = tuple(static.items())
+        try:
+            fragment = self.fragments.get(key)
+        except TypeError:
+            # Unhashable values can't be cached.
+            return self.encode(static, json_encoder), others
+        if fragment is None:
+            fragment = self.encode(static, json_encoder)
+            if len(self.fragments) < self.maxsize:
+                self.fragments[key] = fragment
+        return fragment, others
+
+
+class RenderedProblem:
+    """Problem details prepared for inclusion in a response.
+
+    Instances are passed to the reporter installed using
+    :func:`set_reporter`, allowing the computed data and encoded content
+    to be re-used for logging.
+
+    For problems rendered by :func:`render_json_batch` or
+    :func:`render_xml_batch`, :attr:`batch` is true, and :attr:`content`
+    is the fragment of the batch document for this problem rather than a
+    complete document.
+
+    """
+
+    __slots__ = ('error', 'data', 'private', 'status', 'content',
+                 'content_type', 'batch')
+
+    def __init__(self, error, data, private, status, content, content_type,
+                 batch=False):
+        self.error = error
+        """Exception being reported."""
+
+        self.data = data
+        """Problem details mapping sent to the client."""
+
+        self.private = private
+        """Mapping of fields redacted from the client response."""
+
+        self.status = status
+        """HTTP status code of the problem."""
+
+        self.content = content
+        """Encoded response body, or batch fragment, as bytes."""
+
+        self.content_type = content_type
+        """Media type of the response containing :attr:`content`."""
+
+        self.batch = batch
+        """Whether :attr:`content` is a fragment of a batch document."""
+
+
+_reporter = None
+_reporter_lock = threading.Lock()
+
+
+def set_reporter(reporter):
+    """Install *reporter* to receive each rendered problem.
+
+    *reporter* must provide
+    :class:`~kt.problemdetails.interfaces.IProblemReporter`, or be
+    ``None`` to disable reporting.  The previously installed reporter is
+    returned.
+
+    This may be called while other threads are rendering problems; each
+    rendering uses either the previous or the new reporter throughout.
+    The reporter itself may be called from many threads at once.
+
+    """
+    global _reporter
+    with _reporter_lock:
+        previous = _reporter
+        _reporter = reporter
+    return previous
+
+
+def get_reporter():
+    """Return the currently installed reporter, or ``None``."""
+    return _reporter
+
+
+def prepare(error, encode, content_type, json_encoder=None):
+    """Compute and encode problem details for *error*.
+
+    *encode* is a function like :func:`encode_json` or
+    :func:`encode_xml`; it is called with the client-facing problem
+    details and *json_encoder*.  If a reporter is installed, fields it
+    redacts are removed before encoding, and the reporter is called with
+    the resulting :class:`RenderedProblem`.
+
+    """
+    return _prepare(error,
+                    kt.problemdetails.interfaces.IProblemDetails(error, None),
+                    encode, content_type, json_encoder)
+
+
+def _prepare(error, err, encode, content_type, json_encoder, batch=False):
+    data = _as_dict(error, err)
+    status = _get_status(data)
+    reporter = _reporter
+    if reporter is None:
+        private = {}
+    else:
+        data, private = reporter.redact(data)
+    content = encode(data, json_encoder).encode('utf-8')
+    problem = RenderedProblem(error, data, private, status, content,
+                              content_type, batch)
+    if reporter is not None:
+        try:
+            reporter(problem)
+        except Exception:
+            logger.exception('problem reporter failed')
+    return problem
 
 
 def _get_status(data):
@@ -0,0 +1,235 @@
+"""\
+Parsing of :rfc:`7807` problem details received from other services.
+
+Problem documents are parsed into mappings matching those produced by
+:func:`kt.problemdetails.api.as_dict`, and can be converted to exceptions
+using classes registered for specific problem types::
+
+    @kt.problemdetails.client.register
+    class OutOfStock(kt.problemdetails.client.ProblemError):
+        type = 'https://api.example.com/errors/out-of-stock'
+
+    try:
+        ...
+    except kt.problemdetails.client.ProblemError as e:
+        ...
+
+"""
+
+import json
+import threading
+import xml.etree.ElementTree
+
+import zope.interface
+
+import kt.problemdetails.api
+import kt.problemdetails.interfaces
+
+
+XML_NAMESPACE = 'urn:ietf:rfc:7807'
+
+_XML_PREFIX = '{' + XML_NAMESPACE + '}'
+
+
+@zope.interface.implementer(kt.problemdetails.interfaces.IProblemDetails)
+class ProblemError(Exception):
+    """Exception reconstructed from a problem details document.
+
+    Subclasses can define :attr:`type`, :attr:`title`, and :attr:`status`
+    as class attributes, and be registered using :func:`register` to be
+    used for problems of a specific type.
+
+    Since this provides
+    :class:`~kt.problemdetails.interfaces.IProblemDetails`,
+    :func:`kt.problemdetails.api.as_dict` converts an instance back to
+    the mapping it was created from.
+
+    """
+
+    type = None
+    title = None
+    status = None
+    detail = None
+    instance = None
+
+    def __init__(self, detail=None, *, type=None, title=None, status=None,
+                 instance=None, extensions=None):
+        super(ProblemError, self).__init__(*(() if detail is None
+                                             else (detail,)))
+        self.detail = detail
+        if type is not None:
+            self.type = type
+        if title is not None:
+            self.title = title
+        if status is not None:
+            self.status = status
+        self.instance = instance
+        self._extensions = dict(extensions or ())
+
+    @classmethod
+    def from_dict(cls, data):
+        """Create an exception from problem details mapping *data*."""
+        data = dict(data)
+        fields = {attr: data.pop(attr, None)
+                  for attr in kt.problemdetails.api.STANDARD_FIELDS}
+        return cls(fields.pop('detail'), extensions=data, **fields)
+
+    def extensions(self):
+        return dict(self._extensions)
+
+
+_types = {}
+_types_lock = threading.Lock()
+
+
+def register(cls):
+    """Register exception class *cls* for its problem :attr:`type`.
+
+    *cls* must be a subclass of :class:`ProblemError` with a ``type``
+    attribute.  Returns *cls*, allowing use as a class decorator.
+
+    Registration may be changed while other threads are parsing
+    responses; each lookup sees a consistent registration.
+
+    """
+    if not (isinstance(cls, type) and issubclass(cls, ProblemError)):
+        raise TypeError('registered class must be a subclass of ProblemError')
+    if not cls.type:
+        raise ValueError('registered class must define a problem type')
+    with _types_lock:
+        _types[cls.type] = cls
+    return cls
+
+
+def unregister(cls):
+    """Remove registration for exception class *cls*."""
+    with _types_lock:
+        if _types.get(cls.type) is cls:
+            del _types[cls.type]
+
+
+def lookup(type_uri):
+    """Return the exception class registered for *type_uri*.
+
+    :class:`ProblemError` is returned if no class is registered.
+
+    """
+    return _types.get(type_uri, ProblemError)
+
+
+def as_exception(data):
+    """Convert problem details mapping *data* to an exception.
+
+    The class is determined by the ``type`` field of *data* using
+    :func:`lookup`.
+
+    """
+    return lookup(data.get('type')).from_dict(data)
+
+
+def parse_json(content):
+    """Parse an ``application/problem+json`` document.
+
+    *content* may be bytes or text.  Returns a problem details mapping.
+
+    """
+    data = json.loads(content)
+    if not isinstance(data, dict):
+        raise ValueError('problem details document must be a JSON object')
+    return data
+
+
+def parse_xml(content):
+    """Parse an ``application/problem+xml`` document.
+
+    *content* may be bytes, text, or an iterable of either, such as the
+    chunks of a streamed response body; the document is parsed
+    incrementally.  Returns a problem details mapping.
+
+    Since XML does not preserve value types, all values other than
+    ``status`` are returned as strings, lists, or mappings.  Empty lists
+    and mappings are serialized identically, and are returned as empty
+    lists; so are extension values consisting of whitespace containing a
+    newline, which can't be distinguished from them.  :exc:`ValueError`
+    is raised if *content* is not a well-formed problem details document.
+
+    """
+    # Each stack entry collects (name, value) pairs for the children of
+    # an open element; completed elements are discarded as we go.
+    stack = []
+    data = None
+    for event, elem in _xml_events(content):
+        if event == 'start':
+            if not stack and elem.tag != _XML_PREFIX + 'problem':
+                raise ValueError(f'unexpected root element {elem.tag!r}')
+            stack.append([])
+            continue
+        children = stack.pop()
+        if not stack:
+            data = dict(children)
+        else:
+            name = _local_name(elem.tag)
+            # Standard fields are always scalars, so may be whitespace.
+            scalar = (len(stack) == 1
+                      and name in kt.problemdetails.api.STANDARD_FIELDS)
+            stack[-1].append((name, _xml_value(elem, children, scalar)))
+        elem.clear()
+    if data is None:
+        raise ValueError('incomplete problem details document')
+    status = data.get('status')
+    if isinstance(status, str) and status.strip().isdigit():
+        data['status'] = int(status)
+    return data
+
+
+def parse(content, content_type):
+    """Parse problem details *content* based on *content_type*.
+
+    Returns a problem details mapping.  :exc:`ValueError` is raised if
+    *content_type* is not a supported problem details media type.
+
+    """
+    ctype = content_type.split(';', 1)[0].strip().lower()
+    if ctype == kt.problemdetails.api.CONTENT_TYPE_JSON:
+        return parse_json(content)
+    elif ctype == kt.problemdetails.api.CONTENT_TYPE_XML:
+        return parse_xml(content)
+    raise ValueError(f'unsupported content type {content_type!r}')
+
+
+def from_response(content, content_type):
+    """Convert a problem details response body to an exception."""
+    return as_exception(parse(content, content_type))
+
+
+def _xml_events(content):
+    if isinstance(content, (bytes, str)):
+        content = [content]
+    parser = xml.etree.ElementTree.XMLPullParser(events=('start', 'end'))
+    try:
+        for chunk in content:
+            parser.feed(chunk)
+            yield from parser.read_events()
+        parser.close()
+        yield from parser.read_events()
+    except xml.etree.ElementTree.ParseError as e:
+        raise ValueError(f'malformed problem details document: {e}')
+
+
+def _local_name(tag):
+    if tag.startswith(_XML_PREFIX):
+        return tag[len(_XML_PREFIX):]
+    return tag
+
+
+def _xml_value(elem, children, scalar=False):
+    if not children:
+        text = elem.text or ''
+        # encode_xml writes empty lists and mappings as elements
+        # containing only a newline and indentation.
+        if not scalar and not text.strip() and '\n' in text:
+            return []
+        return text
+    if all(name == 'i' for name, value in children):
+        return [value for name, value in children]
+    return dict(children)
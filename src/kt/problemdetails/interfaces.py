@@ -56,3 +56,53 @@ class IProblemDetails(zope.interface.Interface):
 
     def extensions() -> zope.interface.common.mapping.IEnumerableMapping:
         """Return mapping of extension fields to be included in response."""
+
+
+class IProblemReporter(zope.interface.Interface):
+    """Hook receiving each problem rendered into a response.
+
+    A reporter is installed using
+    :func:`kt.problemdetails.api.set_reporter`.
+
+    """
+
+    def redact(data):
+        """Split problem details into client-facing and private parts.
+
+        Returns a 2-tuple of mappings: the problem details that should be
+        included in the response, and the fields removed from the
+        response.  The *data* mapping must not be modified.
+
+        """
+
+    def __call__(problem):
+        """Report *problem*, a :class:`~kt.problemdetails.api.RenderedProblem`.
+
+        The data and encoded content of the response are available from
+        *problem*, and should be re-used rather than re-computed.
+
+        """
+
+
+class ICacheableProblemDetails(IProblemDetails):
+    """Problem details for which responses may be cached.
+
+    Providing this interface opts in to the addition of caching headers
+    and support for conditional requests when rendering the problem.
+
+    """
+
+    cache_control = zope.schema.TextLine(
+        title='Cache control',
+        description='Value for the Cache-Control response header',
+        required=True,
+    )
+
+    etag = zope.schema.TextLine(
+        title='Version token',
+        description=('Token identifying the content of the response;'
+                     ' the entity tag is derived from this if provided,'
+                     ' otherwise from the encoded response body'),
+        required=False,
+        missing_value=None,
+    )
@@ -0,0 +1,73 @@
+"""\
+Structured logging of rendered problem details.
+
+"""
+
+import logging
+import random
+
+import zope.interface
+
+import kt.problemdetails.interfaces
+
+
+@zope.interface.implementer(kt.problemdetails.interfaces.IProblemReporter)
+class ProblemReporter:
+    """Reporter emitting a log record for each rendered problem.
+
+    Records are emitted on *logger* (a logger or logger name), with the
+    :class:`~kt.problemdetails.api.RenderedProblem` available as the
+    ``problem`` attribute of the log record.  Handlers and formatters can
+    use the data and encoded content from there without re-serializing
+    the problem.
+
+    Fields named in *redact* are removed from the client response, but
+    remain available from ``problem.private`` in the log record.
+
+    Server errors (status 500 and above) are always logged at
+    *server_error_level*.  Other problems are logged at
+    *client_error_level*, sampled at *client_error_rate* (a value between
+    0.0 and 1.0).
+
+    """
+
+    def __init__(self, logger='kt.problemdetails.problems', redact=(),
+                 client_error_rate=1.0, client_error_level=logging.INFO,
+                 server_error_level=logging.ERROR):
+        if not 0.0 <= client_error_rate <= 1.0:
+            raise ValueError('client_error_rate must be between 0.0 and 1.0')
+        if isinstance(logger, str):
+            logger = logging.getLogger(logger)
+        self.logger = logger
+        self.redacted = frozenset(redact)
+        self.client_error_rate = client_error_rate
+        self.client_error_level = client_error_level
+        self.server_error_level = server_error_level
+
+    def redact(self, data):
+        private = {}
+        if self.redacted and not self.redacted.isdisjoint(data):
+            data = dict(data)
+            for name in self.redacted:
+                if name in data:
+                    private[name] = data.pop(name)
+        return data, private
+
+    def sample(self, status):
+        """Determine whether a problem with *status* should be logged."""
+        if status >= 500:
+            return True
+        rate = self.client_error_rate
+        return rate >= 1.0 or (rate > 0.0 and random.random() < rate)
+
+    def __call__(self, problem):
+        if not self.sample(problem.status):
+            return
+        if problem.status >= 500:
+            level = self.server_error_level
+        else:
+            level = self.client_error_level
+        if self.logger.isEnabledFor(level):
+            self.logger.log(level, 'problem %s: %s', problem.status,
+                            problem.data.get('title', ''),
+                            extra=dict(problem=problem))
@@ -0,0 +1,132 @@
+"""\
+WSGI middleware rendering uncaught exceptions as problem details.
+
+This handles errors raised outside of Flask's request handling, such as
+in other middleware or in non-Flask applications::
+
+    application = kt.problemdetails.wsgi.ProblemDetailsMiddleware(
+        application)
+
+No Flask application or request context is used.
+
+"""
+
+import http
+import logging
+
+import werkzeug.datastructures
+import werkzeug.http
+
+import kt.problemdetails.api
+
+
+logger = logging.getLogger(__name__)
+
+# Offered in order of preference when the client's preferences are equal.
+_JSON_TYPES = (kt.problemdetails.api.CONTENT_TYPE_JSON, 'application/json')
+_XML_TYPES = (kt.problemdetails.api.CONTENT_TYPE_XML, 'application/xml',
+              'text/xml')
+
+
+class ProblemDetailsMiddleware:
+    """WSGI middleware rendering exceptions raised by *app*.
+
+    Exceptions raised by *app*, or while retrieving the first chunk of
+    the response body, are adapted to
+    :class:`~kt.problemdetails.interfaces.IProblemDetails` and rendered
+    as ``application/problem+xml`` if the client prefers XML, or as
+    ``application/problem+json`` otherwise.  Exceptions raised after the
+    response has started are propagated to the server.
+
+    Lists, tuples, and ``wsgi.file_wrapper`` objects returned by *app*
+    are passed to the server unchanged, so it can still determine the
+    content length or use platform-specific file handling.
+
+    *json_encoder* is the encoder class used for extension values.
+
+    """
+
+    def __init__(self, app, json_encoder=None):
+        self.app = app
+        self.json_encoder = json_encoder
+
+    def __call__(self, environ, start_response):
+        try:
+            result = self.app(environ, start_response)
+        except Exception as e:
+            return self.render(environ, start_response, e)
+        # Iterating these can't raise, so there's no need to look at the
+        # body; wrapping them would hide them from the server.
+        if isinstance(result, (list, tuple)):
+            return result
+        file_wrapper = environ.get('wsgi.file_wrapper')
+        if isinstance(file_wrapper, type) and isinstance(result, file_wrapper):
+            return result
+        try:
+            iterator = iter(result)
+            first = next(iterator)
+        except StopIteration:
+            return _Body((), result)
+        except Exception as e:
+            _close(result)
+            return self.render(environ, start_response, e)
+        return _Body(_prepend(first, iterator), result)
+
+    def render(self, environ, start_response, error):
+        """Send problem details for *error* as the response."""
+        logger.error('uncaught exception in WSGI application',
+                     exc_info=error)
+        if _prefers_xml(environ.get('HTTP_ACCEPT', '')):
+            encode = kt.problemdetails.api.encode_xml
+            ctype = kt.problemdetails.api.CONTENT_TYPE_XML
+        else:
+            encode = kt.problemdetails.api.encode_json
+            ctype = kt.problemdetails.api.CONTENT_TYPE_JSON
+        problem = kt.problemdetails.api.prepare(
+            error, encode, ctype, self.json_encoder)
+        headers = [
+            ('Content-Type', problem.content_type),
+            ('Content-Length', str(len(problem.content))),
+        ]
+        exc_info = (type(error), error, error.__traceback__)
+        start_response(_status_line(problem.status), headers, exc_info)
+        return [problem.content]
+
+
+class _Body:
+    """Response body iterable closing the application's result."""
+
+    def __init__(self, iterable, result):
+        self.iterable = iterable
+        self.result = result
+
+    def __iter__(self):
+        return iter(self.iterable)
+
+    def close(self):
+        _close(self.result)
+
+
+def _prepend(first, iterator):
+    yield first
+    yield from iterator
+
+
+def _close(result):
+    close = getattr(result, 'close', None)
+    if close is not None:
+        close()
+
+
+def _prefers_xml(accept):
+    accept = werkzeug.http.parse_accept_header(
+        accept, werkzeug.datastructures.MIMEAccept)
+    return accept.best_match(_JSON_TYPES + _XML_TYPES) in _XML_TYPES
+
+
+def _status_line(status):
+    try:
+        phrase = http.HTTPStatus(status).phrase
+    except ValueError:
+        phrase = 'Unknown'
+    return f'{status} {phrase}'
@@ -95,3 +95,80 @@ class AdaptationTestCase(unittest.TestCase):
         self.assertEqual(rec.name, 'kt.problemdetails.api')
         self.assertEqual(rec.getMessage(),
                          "extensions should not contain key 'status'")
+
+
+class DerivedError(tests.utils.SampleError):
+    """Derived evil."""
+
+
+class FallbackTestCase(unittest.TestCase):
+
+    def register(self, cls, **kwargs):
+        kt.problemdetails.api.register_fallback(cls, **kwargs)
+        self.addCleanup(kt.problemdetails.api.unregister_fallback, cls)
+
+    def test_fallback_cached(self):
+        first = kt.problemdetails.api.get_fallback(tests.utils.SampleError)
+        second = kt.problemdetails.api.get_fallback(tests.utils.SampleError)
+
+        self.assertIs(first, second)
+        self.assertEqual(first.title, 'Something evil this way comes.')
+        self.assertEqual(first.status, 500)
+        self.assertIsNone(first.type)
+        self.assertTrue(first.expose_detail)
+
+    def test_fallback_data_not_shared(self):
+        error = tests.utils.SampleError('bad stuff happened')
+
+        data = kt.problemdetails.api.as_dict(error)
+        data['title'] = 'changed'
+
+        fallback = kt.problemdetails.api.get_fallback(error.__class__)
+        self.assertEqual(fallback.data['title'],
+                         'Something evil this way comes.')
+
+    def test_registration_applies_to_subclasses(self):
+        self.register(tests.utils.SampleError, status=503,
+                      type='https://api.example.com/errors/evil')
+
+        data = kt.problemdetails.api.as_dict(DerivedError('oops'))
+
+        self.assertEqual(data, dict(
+            detail='oops',
+            status=503,
+            title='Derived evil.',
+            type='https://api.example.com/errors/evil',
+        ))
+
+    def test_fields_resolved_along_mro(self):
+        self.register(BaseException, expose_detail=False, status=502)
+        self.register(tests.utils.SampleError, title='Evil')
+        self.register(DerivedError, status=504)
+
+        fallback = kt.problemdetails.api.get_fallback(DerivedError)
+
+        self.assertEqual(fallback.title, 'Evil')
+        self.assertEqual(fallback.status, 504)
+        self.assertFalse(fallback.expose_detail)
+
+    def test_detail_suppressed(self):
+        self.register(BaseException, expose_detail=False)
+        error = tests.utils.SampleError('password=hunter2')
+
+        data = kt.problemdetails.api.as_dict(error)
+
+        self.assertNotIn('detail', data)
+        self.assertEqual(data['status'], 500)
+        self.assertEqual(data['title'], 'Something evil this way comes.')
+
+    def test_registration_changes_invalidate_cache(self):
+        before = kt.problemdetails.api.get_fallback(DerivedError)
+        self.register(tests.utils.SampleError, status=503)
+
+        during = kt.problemdetails.api.get_fallback(DerivedError)
+        kt.problemdetails.api.unregister_fallback(tests.utils.SampleError)
+        after = kt.problemdetails.api.get_fallback(DerivedError)
+
+        self.assertEqual(before.status, 500)
+        self.assertEqual(during.status, 503)
+        self.assertEqual(after.status, 500)
@@ -0,0 +1,220 @@
+"""\
+Tests for kt.problemdetails.api.render_*_batch functions.
+
+"""
+
+import json
+
+import flask.json
+
+import kt.problemdetails.api
+import kt.problemdetails.reporting
+import tests.utils
+
+
+class Lazy:
+    """Text value that isn't a str, like a lazily-translated string."""
+
+    def __init__(self, text):
+        self.text = text
+
+    def __str__(self):
+        return self.text
+
+
+class LazyEncoder(flask.json.JSONEncoder):
+
+    def default(self, o):
+        if isinstance(o, Lazy):
+            return str(o)
+        return super(LazyEncoder, self).default(o)
+
+
+class BatchTestCase(tests.utils.ProblemDetailsTestCase):
+
+    def render(self, errors, render):
+
+        @self.app.route('/foo')
+        def my_route():
+            return render(errors)
+
+        resp = self.http_get('/foo', status=207)
+        # Consume the streamed response while the caller is watching.
+        resp.get_data()
+        resp.close()
+        return resp
+
+    def errors(self):
+        first = tests.utils.SampleProblemDetails()
+        second = tests.utils.SampleProblemDetails(
+            extensions=dict(item=2))
+        second.detail = 'Evil is coming to *my* town.'
+        second.instance = None
+        return [first, second, tests.utils.SampleError('bad stuff')]
+
+
+class JSONBatchTestCase(BatchTestCase):
+
+    def test_batch(self):
+        errors = self.errors()
+
+        resp = self.render(errors, kt.problemdetails.api.render_json_batch)
+
+        self.assertEqual(resp.headers['Content-Type'], 'application/json')
+        data = json.loads(resp.data)
+        expected = [kt.problemdetails.api.as_dict(error)
+                    for error in errors]
+        self.assertEqual(data, dict(problems=expected))
+
+    def test_empty_batch(self):
+        resp = self.render([], kt.problemdetails.api.render_json_batch)
+
+        self.assertEqual(json.loads(resp.data), dict(problems=[]))
+
+    def test_lazy_iterable(self):
+        errors = (tests.utils.SampleError(f'item {i}') for i in range(1000))
+
+        resp = self.render(errors, kt.problemdetails.api.render_json_batch)
+
+        problems = json.loads(resp.data)['problems']
+        self.assertEqual(len(problems), 1000)
+        self.assertEqual(problems[999]['detail'], 'item 999')
+        self.assertEqual(problems[999]['status'], 500)
+
+    def test_custom_json_encoder(self):
+        self.app.json_encoder = LazyEncoder
+        error = tests.utils.SampleProblemDetails()
+        error.title = Lazy('Evil is Coming')
+
+        resp = self.render([error, error],
+                           kt.problemdetails.api.render_json_batch)
+
+        problems = json.loads(resp.data)['problems']
+        self.assertEqual([p['title'] for p in problems],
+                         ['Evil is Coming', 'Evil is Coming'])
+
+
+class XMLBatchTestCase(BatchTestCase):
+
+    def test_batch(self):
+        resp = self.render(self.errors(),
+                           kt.problemdetails.api.render_xml_batch)
+
+        self.assertEqual(resp.headers['Content-Type'], 'application/xml')
+        self.assertEqual(
+            resp.data.decode('utf-8'),
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<problems xmlns="urn:ietf:rfc:7807">\n'
+            '  <problem>\n'
+            '    <type>https://api.example.com/errors/evil</type>\n'
+            '    <title>Evil is Coming</title>\n'
+            '    <status>400</status>\n'
+            '    <detail>Evil is coming to *your* town.</detail>\n'
+            '    <instance>https://api.example.com/errors/evil?town=54321'
+            '</instance>\n'
+            '\n'
+            '    <severity>really, really bad</severity>\n'
+            '    <whence>Depths of Hades</whence>\n'
+            '  </problem>\n'
+            '  <problem>\n'
+            '    <type>https://api.example.com/errors/evil</type>\n'
+            '    <title>Evil is Coming</title>\n'
+            '    <status>400</status>\n'
+            '    <detail>Evil is coming to *my* town.</detail>\n'
+            '\n'
+            '    <item>2</item>\n'
+            '  </problem>\n'
+            '  <problem>\n'
+            '    <title>Something evil this way comes.</title>\n'
+            '    <status>500</status>\n'
+            '    <detail>bad stuff</detail>\n'
+            '  </problem>\n'
+            '</problems>\n'
+        )
+
+    def test_without_standard_fields(self):
+        error = tests.utils.SampleProblemDetails(extensions=dict(item=1))
+        error.detail = None
+        error.instance = None
+        error.status = None
+        error.title = None
+        error.type = None
+
+        with self.assertLogs('kt.problemdetails'):
+            resp = self.render([error],
+                               kt.problemdetails.api.render_xml_batch)
+
+        self.assertEqual(
+            resp.data.decode('utf-8'),
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<problems xmlns="urn:ietf:rfc:7807">\n'
+            '  <problem>\n'
+            '    <item>1</item>\n'
+            '  </problem>\n'
+            '</problems>\n'
+        )
+
+
+class BatchReportingTestCase(BatchTestCase):
+
+    def setUp(self):
+        super(BatchReportingTestCase, self).setUp()
+        reporter = kt.problemdetails.reporting.ProblemReporter()
+        previous = kt.problemdetails.api.set_reporter(reporter)
+        self.addCleanup(kt.problemdetails.api.set_reporter, previous)
+
+    def test_items_reported_as_fragments(self):
+        error = tests.utils.SampleProblemDetails()
+
+        with self.assertLogs('kt.problemdetails.problems') as cm:
+            resp = self.render([error],
+                               kt.problemdetails.api.render_xml_batch)
+
+        rec, = cm.records
+        self.assertTrue(rec.problem.batch)
+        self.assertEqual(rec.problem.content_type, 'application/xml')
+        self.assertTrue(rec.problem.content.startswith(b'  <problem>\n'))
+        self.assertIn(rec.problem.content, resp.data)
+
+    def test_single_problem_not_batch(self):
+
+        @self.app.route('/single')
+        def my_route():
+            return kt.problemdetails.api.render_json(
+                tests.utils.SampleProblemDetails())
+
+        with self.assertLogs('kt.problemdetails.problems') as cm:
+            self.http_get('/single', status=400)
+
+        rec, = cm.records
+        self.assertFalse(rec.problem.batch)
+
+
+class StaticFragmentsTestCase(tests.utils.ProblemDetailsTestCase):
+
+    def test_fragments_reused(self):
+        calls = []
+
+        def encode(data, json_encoder):
+            calls.append(data)
+            return repr(data)
+
+        fragments = kt.problemdetails.api._StaticFragments(encode)
+        data = dict(title='T', status=400, detail='one', type='urn:x')
+
+        first, rest = fragments.split(data)
+        second, _ = fragments.split(dict(data, detail='two'))
+
+        self.assertIs(first, second)
+        self.assertEqual(rest, dict(detail='one'))
+        self.assertEqual(calls, [dict(type='urn:x', title='T', status=400)])
+
+    def test_fragments_bounded(self):
+        fragments = kt.problemdetails.api._StaticFragments(
+            lambda data, json_encoder: repr(data))
+        fragments.maxsize = 2
+
+        for status in range(400, 410):
+            fragments.split(dict(status=status))
+
+        self.assertEqual(len(fragments.fragments), 2)
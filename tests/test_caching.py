@@ -0,0 +1,143 @@
+"""\
+Tests for HTTP caching support in kt.problemdetails.api.render_*.
+
+"""
+
+import hashlib
+
+import zope.interface
+
+import kt.problemdetails.api
+import kt.problemdetails.interfaces
+import tests.utils
+
+
+@zope.interface.implementer(
+    kt.problemdetails.interfaces.ICacheableProblemDetails)
+class GoneProblemDetails(tests.utils.SampleProblemDetails):
+
+    cache_control = 'public, max-age=86400'
+    etag = None
+
+    def __init__(self, etag=None):
+        super(GoneProblemDetails, self).__init__()
+        self.status = 410
+        self.etag = etag
+        self.extensions_calls = 0
+
+    def extensions(self):
+        self.extensions_calls += 1
+        return super(GoneProblemDetails, self).extensions()
+
+
+@zope.interface.implementer(
+    kt.problemdetails.interfaces.ICacheableProblemDetails)
+class MinimalCacheableProblemDetails(tests.utils.SampleProblemDetails):
+
+    cache_control = 'public, max-age=60'
+
+
+class CachingTestCase(tests.utils.ProblemDetailsTestCase):
+
+    def setUp(self):
+        super(CachingTestCase, self).setUp()
+        self.error = GoneProblemDetails()
+
+        @self.app.route('/json', methods=['GET', 'POST'])
+        def json_route():
+            return kt.problemdetails.api.render_json(self.error)
+
+        @self.app.route('/no-store')
+        def no_store_route():
+            return kt.problemdetails.api.render_json(
+                self.error, headers={'Cache-Control': 'no-store'})
+
+        @self.app.route('/xml')
+        def xml_route():
+            return kt.problemdetails.api.render_xml(self.error)
+
+    def test_not_cacheable(self):
+        self.error = tests.utils.SampleProblemDetails()
+
+        resp = self.http_get('/json', status=400)
+
+        self.assertNotIn('ETag', resp.headers)
+        self.assertNotIn('Cache-Control', resp.headers)
+
+    def test_etag_from_body(self):
+        resp = self.http_get('/json', status=410)
+
+        self.assertEqual(resp.headers['Cache-Control'],
+                         'public, max-age=86400')
+        expected = hashlib.sha256(resp.data).hexdigest()[:32]
+        self.assertEqual(resp.headers['ETag'], f'"{expected}"')
+
+    def test_caller_cache_control_kept(self):
+        resp = self.http_get('/no-store', status=410)
+
+        self.assertEqual(resp.headers.getlist('Cache-Control'), ['no-store'])
+        self.assertIn('ETag', resp.headers)
+
+    def test_etag_attribute_optional(self):
+        self.error = MinimalCacheableProblemDetails()
+
+        resp = self.http_get('/json', status=400)
+
+        self.assertEqual(resp.headers['Cache-Control'], 'public, max-age=60')
+        expected = hashlib.sha256(resp.data).hexdigest()[:32]
+        self.assertEqual(resp.headers['ETag'], f'"{expected}"')
+
+    def test_not_modified_from_body(self):
+        etag = self.http_get('/json', status=410).headers['ETag']
+
+        resp = self.client.get('/json', headers={'If-None-Match': etag})
+
+        self.assertEqual(resp.status_code, 304)
+        self.assertEqual(resp.data, b'')
+        self.assertEqual(resp.headers['ETag'], etag)
+        self.assertEqual(resp.headers['Cache-Control'],
+                         'public, max-age=86400')
+
+    def test_modified(self):
+        resp = self.client.get('/json', headers={'If-None-Match': '"other"'})
+
+        self.assertEqual(resp.status_code, 410)
+        self.assertEqual(resp.get_json()['status'], 410)
+
+    def test_not_modified_from_token_without_encoding(self):
+        self.error = GoneProblemDetails(etag='retired-v1')
+        etag = self.http_get('/json', status=410).headers['ETag']
+        self.assertEqual(self.error.extensions_calls, 1)
+
+        resp = self.client.get('/json', headers={'If-None-Match': etag})
+
+        self.assertEqual(resp.status_code, 304)
+        self.assertEqual(resp.headers['ETag'], etag)
+        self.assertEqual(self.error.extensions_calls, 1)
+
+    def test_token_etag_depends_on_media_type(self):
+        self.error = GoneProblemDetails(etag='retired-v1')
+
+        json_etag = self.http_get('/json', status=410).headers['ETag']
+        xml_etag = self.http_get('/xml', status=410).headers['ETag']
+
+        self.assertNotEqual(json_etag, xml_etag)
+        resp = self.client.get('/xml', headers={'If-None-Match': json_etag})
+        self.assertEqual(resp.status_code, 410)
+
+    def test_weak_and_any_match(self):
+        etag = self.http_get('/xml', status=410).headers['ETag']
+
+        weak = self.client.get('/xml', headers={'If-None-Match': 'W/' + etag})
+        star = self.client.get('/xml', headers={'If-None-Match': '*'})
+
+        self.assertEqual(weak.status_code, 304)
+        self.assertEqual(star.status_code, 304)
+
+    def test_unsafe_method_not_conditional(self):
+        etag = self.http_get('/json', status=410).headers['ETag']
+
+        resp = self.client.post('/json', headers={'If-None-Match': etag})
+
+        self.assertEqual(resp.status_code, 410)
+        self.assertEqual(resp.headers['ETag'], etag)
@@ -0,0 +1,181 @@
+"""\
+Tests for kt.problemdetails.client.
+
+"""
+
+import json
+import unittest
+
+import kt.problemdetails.api
+import kt.problemdetails.client
+import tests.utils
+
+
+class EvilError(kt.problemdetails.client.ProblemError):
+    type = 'https://api.example.com/errors/evil'
+
+
+class ParseTestCase(tests.utils.ProblemDetailsTestCase):
+
+    def render(self, error, render):
+
+        @self.app.route('/foo')
+        def my_route():
+            return render(error)
+
+        resp = self.http_get('/foo', status=None)
+        return resp.data, resp.headers['Content-Type']
+
+    def test_parse_json(self):
+        error = tests.utils.SampleProblemDetails(
+            extensions=dict(sequence=[dict(field='abc')]))
+
+        data = kt.problemdetails.client.parse(
+            *self.render(error, kt.problemdetails.api.render_json))
+
+        self.assertEqual(data, kt.problemdetails.api.as_dict(error))
+
+    def test_parse_xml(self):
+        error = tests.utils.SampleProblemDetails(
+            extensions=dict(
+                sequence=['abc', 'def'],
+                name=dict(given='Frank', surname='Stein'),
+            ))
+
+        data = kt.problemdetails.client.parse(
+            *self.render(error, kt.problemdetails.api.render_xml))
+
+        self.assertEqual(data, kt.problemdetails.api.as_dict(error))
+
+    def test_parse_xml_chunks(self):
+        error = tests.utils.SampleProblemDetails()
+        content, ctype = self.render(error, kt.problemdetails.api.render_xml)
+        chunks = [content[i:i + 7] for i in range(0, len(content), 7)]
+
+        data = kt.problemdetails.client.parse_xml(chunks)
+
+        self.assertEqual(data, kt.problemdetails.api.as_dict(error))
+
+    def test_parse_xml_wrong_root(self):
+        with self.assertRaises(ValueError):
+            kt.problemdetails.client.parse_xml('<problem/>')
+
+    def test_parse_xml_incomplete(self):
+        with self.assertRaises(ValueError):
+            kt.problemdetails.client.parse_xml(
+                '<problem xmlns="urn:ietf:rfc:7807"><status>')
+
+    def test_parse_xml_malformed(self):
+        with self.assertRaises(ValueError):
+            kt.problemdetails.client.parse_xml(b'not xml')
+
+    def test_parse_xml_malformed_chunk(self):
+        with self.assertRaises(ValueError):
+            kt.problemdetails.client.parse_xml(
+                [b'<problem xmlns="urn:ietf:rfc:7807">', b'<a></b>'])
+
+    def test_parse_json_empty_containers(self):
+        error = tests.utils.SampleProblemDetails(
+            extensions=dict(errors=[], context={}))
+
+        data = kt.problemdetails.client.parse(
+            *self.render(error, kt.problemdetails.api.render_json))
+
+        self.assertEqual(data, kt.problemdetails.api.as_dict(error))
+
+    def test_parse_xml_empty_list(self):
+        error = tests.utils.SampleProblemDetails(
+            extensions=dict(errors=[], nested=dict(errors=[])))
+
+        data = kt.problemdetails.client.parse(
+            *self.render(error, kt.problemdetails.api.render_xml))
+
+        self.assertEqual(data, kt.problemdetails.api.as_dict(error))
+
+    def test_parse_xml_empty_mapping(self):
+        # XML can't distinguish empty mappings from empty lists.
+        error = tests.utils.SampleProblemDetails(
+            extensions=dict(context={}, text=''))
+
+        data = kt.problemdetails.client.parse(
+            *self.render(error, kt.problemdetails.api.render_xml))
+
+        self.assertEqual(data['context'], [])
+        self.assertEqual(data['text'], '')
+
+    def test_parse_xml_whitespace_standard_fields(self):
+        error = tests.utils.SampleProblemDetails(
+            extensions=dict(nested=dict(detail='\n')))
+        error.detail = '\n'
+        error.title = ' \n '
+
+        data = kt.problemdetails.client.parse(
+            *self.render(error, kt.problemdetails.api.render_xml))
+
+        self.assertEqual(data['detail'], '\n')
+        self.assertEqual(data['title'], ' \n ')
+        # Only top-level standard fields are known to be scalars.
+        self.assertEqual(data['nested'], dict(detail=[]))
+        reconstructed = kt.problemdetails.client.as_exception(data)
+        self.assertEqual(str(reconstructed), '\n')
+
+    def test_parse_json_not_object(self):
+        with self.assertRaises(ValueError):
+            kt.problemdetails.client.parse_json('[]')
+
+    def test_unsupported_content_type(self):
+        with self.assertRaises(ValueError):
+            kt.problemdetails.client.parse('{}', 'application/json')
+
+    def test_content_type_parameters_ignored(self):
+        data = kt.problemdetails.client.parse(
+            '{"status": 404}', 'application/problem+json; charset=utf-8')
+
+        self.assertEqual(data, dict(status=404))
+
+
+class ExceptionTestCase(unittest.TestCase):
+
+    def setUp(self):
+        kt.problemdetails.client.register(EvilError)
+        self.addCleanup(kt.problemdetails.client.unregister, EvilError)
+
+    def test_registered_type(self):
+        original = tests.utils.SampleProblemDetails()
+        content = json.dumps(kt.problemdetails.api.as_dict(original))
+
+        error = kt.problemdetails.client.from_response(
+            content, kt.problemdetails.api.CONTENT_TYPE_JSON)
+
+        self.assertIsInstance(error, EvilError)
+        self.assertEqual(str(error), 'Evil is coming to *your* town.')
+        self.assertEqual(error.status, 400)
+        self.assertEqual(error.extensions(), original.extensions())
+        # Round trip:
+        self.assertEqual(kt.problemdetails.api.as_dict(error),
+                         kt.problemdetails.api.as_dict(original))
+
+    def test_unregistered_type(self):
+        error = kt.problemdetails.client.as_exception(
+            dict(type='https://api.example.com/errors/other', status=409))
+
+        self.assertIs(type(error), kt.problemdetails.client.ProblemError)
+        self.assertEqual(error.type, 'https://api.example.com/errors/other')
+        self.assertEqual(kt.problemdetails.api.as_dict(error),
+                         dict(type='https://api.example.com/errors/other',
+                              status=409))
+
+    def test_unregister(self):
+        kt.problemdetails.client.unregister(EvilError)
+
+        self.assertIs(kt.problemdetails.client.lookup(EvilError.type),
+                      kt.problemdetails.client.ProblemError)
+
+    def test_register_requires_type(self):
+        with self.assertRaises(ValueError):
+            kt.problemdetails.client.register(
+                kt.problemdetails.client.ProblemError)
+
+    def test_register_requires_problem_error(self):
+        with self.assertRaises(TypeError):
+            kt.problemdetails.client.register(ValueError)
@@ -0,0 +1,315 @@
+"""\
+Stress tests rendering problems concurrently from threads and greenlets.
+
+Set the ``KT_PROBLEMDETAILS_STRESS_REPORT`` environment variable to have
+throughput by worker count written to standard error.
+
+"""
+
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import unittest
+
+import flask
+import zope.component
+import zope.interface
+
+import kt.problemdetails.api
+import kt.problemdetails.client
+import kt.problemdetails.interfaces
+import kt.problemdetails.reporting
+import tests.utils
+
+
+try:
+    import gevent
+except ImportError:  # pragma: no cover
+    gevent = None
+
+
+RENDERS_PER_WORKER = 200
+WORKER_COUNTS = (1, 2, 4, 8)
+
+# Records are emitted, but not written anywhere.
+logging.getLogger(__name__ + '.problems').addHandler(logging.NullHandler())
+
+
+class IFlaky(zope.interface.Interface):
+    """Marker interface for errors whose adapter comes and goes."""
+
+
+class EvilError(kt.problemdetails.client.ProblemError):
+    type = 'https://api.example.com/errors/evil'
+
+
+class StressTests:
+    """Stress tests, parameterized by how workers are run.
+
+    Subclasses define ``spawn(count, target)``, returning *count* started
+    workers running *target*, and ``join(workers)``.
+
+    """
+
+    results = None
+
+    @classmethod
+    def setUpClass(cls):
+        cls.results = []
+
+    @classmethod
+    def tearDownClass(cls):
+        if cls.results and os.environ.get('KT_PROBLEMDETAILS_STRESS_REPORT'):
+            print(f'\n{cls.__name__} throughput:', file=sys.stderr)
+            for workers, rate in cls.results:
+                print(f'  {workers:3d} workers: {rate:10.0f} renders/s',
+                      file=sys.stderr)
+
+    def setUp(self):
+        self.app = flask.Flask(__name__)
+        self.errors = []
+        self.failures = []
+        self.stop = threading.Event()
+
+        reporter = kt.problemdetails.reporting.ProblemReporter(
+            logger=__name__ + '.problems', redact=['whence'],
+            client_error_rate=0.5)
+        previous = kt.problemdetails.api.set_reporter(reporter)
+        self.addCleanup(kt.problemdetails.api.set_reporter, previous)
+
+    def render_many(self):
+        renders = [
+            kt.problemdetails.api.render_json,
+            kt.problemdetails.api.render_xml,
+        ]
+        try:
+            with self.app.test_request_context('/'):
+                for i in range(RENDERS_PER_WORKER):
+                    if i % 3 == 0:
+                        error = tests.utils.SampleProblemDetails()
+                        expected = {400}
+                    else:
+                        error = tests.utils.SampleError(f'item {i}')
+                        zope.interface.alsoProvides(error, IFlaky)
+                        expected = {409, 500}
+                    resp = renders[i % 2](error)
+                    self.switch()
+                    if resp.status_code not in expected:
+                        self.failures.append(resp.status_code)
+                    else:
+                        self.check_content(resp)
+        except Exception as e:
+            self.errors.append(e)
+
+    def check_content(self, resp):
+        data = kt.problemdetails.client.parse(resp.data, resp.content_type)
+        if data.get('status') != resp.status_code:
+            self.failures.append(data)
+        elif 'whence' in data:
+            self.failures.append(data)
+        elif resp.status_code == 409 and data.get('exception_class') != (
+                'tests.utils.SampleError'):
+            self.failures.append(data)
+
+    def toggle_adapter(self):
+        """Register and unregister the adapter for IFlaky until stopped."""
+        gsm = zope.component.getGlobalSiteManager()
+        iface = kt.problemdetails.interfaces.IProblemDetails
+        while not self.stop.is_set():
+            gsm.registerAdapter(tests.utils.SampleAdapter, (IFlaky,), iface)
+            self.pause()
+            gsm.unregisterAdapter(tests.utils.SampleAdapter, (IFlaky,), iface)
+            self.pause()
+
+    def pause(self):
+        time.sleep(0.0001)
+
+    def switch(self):
+        """Allow other workers to run between renders."""
+
+    def run_workers(self, count):
+        toggler, = self.spawn(1, self.toggle_adapter)
+        start = time.perf_counter()
+        self.join(self.spawn(count, self.render_many))
+        elapsed = time.perf_counter() - start
+        self.stop.set()
+        self.join([toggler])
+        self.assertEqual(self.errors, [])
+        self.assertEqual(self.failures, [])
+        self.results.append((count, count * RENDERS_PER_WORKER / elapsed))
+
+    def test_client_registration_toggled(self):
+        content = json.dumps(kt.problemdetails.api.as_dict(
+            tests.utils.SampleProblemDetails()))
+        ctype = kt.problemdetails.api.CONTENT_TYPE_JSON
+        expected = (EvilError, kt.problemdetails.client.ProblemError)
+
+        def toggle():
+            while not self.stop.is_set():
+                kt.problemdetails.client.register(EvilError)
+                self.pause()
+                kt.problemdetails.client.unregister(EvilError)
+                self.pause()
+
+        def parse_many():
+            try:
+                for i in range(RENDERS_PER_WORKER):
+                    error = kt.problemdetails.client.from_response(
+                        content, ctype)
+                    self.switch()
+                    if type(error) not in expected:
+                        self.failures.append(type(error))
+                    elif error.type != EvilError.type or error.status != 400:
+                        self.failures.append(error)
+            except Exception as e:
+                self.errors.append(e)
+
+        self.addCleanup(kt.problemdetails.client.unregister, EvilError)
+        toggler, = self.spawn(1, toggle)
+        self.join(self.spawn(4, parse_many))
+        self.stop.set()
+        self.join([toggler])
+        self.assertEqual(self.errors, [])
+        self.assertEqual(self.failures, [])
+
+    def test_fallback_registration_toggled(self):
+        # A plain subclass, so no other test's adapter registrations apply.
+        cls = type('ToggledError', (tests.utils.SampleError,), {})
+
+        def check(status):
+            # A fallback cached concurrently with the last change would
+            # remain stale until the next one.
+            self.pause()
+            fallback = kt.problemdetails.api.get_fallback(cls)
+            if fallback.status != status:
+                self.failures.append(fallback)
+
+        def toggle():
+            while not self.stop.is_set():
+                kt.problemdetails.api.register_fallback(cls, status=503)
+                check(503)
+                kt.problemdetails.api.unregister_fallback(cls)
+                check(500)
+
+        def render_many():
+            try:
+                with self.app.test_request_context('/'):
+                    for i in range(RENDERS_PER_WORKER):
+                        resp = kt.problemdetails.api.render_json(
+                            cls(f'item {i}'))
+                        self.switch()
+                        data = resp.get_json()
+                        if resp.status_code not in (500, 503):
+                            self.failures.append(resp.status_code)
+                        elif data['status'] != resp.status_code:
+                            self.failures.append(data)
+            except Exception as e:
+                self.errors.append(e)
+
+        self.addCleanup(kt.problemdetails.api.unregister_fallback, cls)
+        toggler, = self.spawn(1, toggle)
+        self.join(self.spawn(4, render_many))
+        self.stop.set()
+        self.join([toggler])
+        self.assertEqual(self.errors, [])
+        self.assertEqual(self.failures, [])
+
+    def test_workers(self):
+        for count in WORKER_COUNTS:
+            with self.subTest(workers=count):
+                self.stop.clear()
+                self.run_workers(count)
+
+
+class ThreadStressTestCase(StressTests, unittest.TestCase):
+
+    def setUp(self):
+        super(ThreadStressTestCase, self).setUp()
+        # Switch threads far more often than usual, so races are likely.
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        self.addCleanup(sys.setswitchinterval, interval)
+        # Adapter lookups in zope.interface can fail while another thread
+        # unregisters an adapter, so the registration is fixed for threads.
+        gsm = zope.component.getGlobalSiteManager()
+        iface = kt.problemdetails.interfaces.IProblemDetails
+        gsm.registerAdapter(tests.utils.SampleAdapter, (IFlaky,), iface)
+        self.addCleanup(gsm.unregisterAdapter, tests.utils.SampleAdapter,
+                        (IFlaky,), iface)
+
+    def spawn(self, count, target):
+        threads = [threading.Thread(target=target) for i in range(count)]
+        for thread in threads:
+            thread.start()
+        return threads
+
+    def join(self, workers):
+        for thread in workers:
+            thread.join()
+
+    def toggle_adapter(self):
+        self.stop.wait()
+
+    def test_reporter_swapped_while_rendering(self):
+        reporters = [
+            kt.problemdetails.reporting.ProblemReporter(
+                logger=__name__ + '.problems', redact=['whence']),
+            kt.problemdetails.reporting.ProblemReporter(
+                logger=__name__ + '.problems', redact=['whence', 'severity']),
+        ]
+
+        def swap():
+            i = 0
+            while not self.stop.is_set():
+                kt.problemdetails.api.set_reporter(reporters[i % 2])
+                i += 1
+                self.pause()
+
+        swapper, = self.spawn(1, swap)
+        self.join(self.spawn(4, self.render_many))
+        self.stop.set()
+        self.join([swapper])
+        self.assertEqual(self.errors, [])
+        self.assertEqual(self.failures, [])
+
+    def test_batch_rendering(self):
+        @self.app.route('/batch')
+        def batch():
+            return kt.problemdetails.api.render_json_batch(
+                tests.utils.SampleError(f'item {i}')
+                for i in range(RENDERS_PER_WORKER))
+
+        def fetch():
+            try:
+                resp = self.app.test_client().get('/batch')
+                problems = json.loads(resp.get_data())['problems']
+                resp.close()
+                details = [p['detail'] for p in problems]
+                if details != [f'item {i}'
+                               for i in range(RENDERS_PER_WORKER)]:
+                    self.failures.append(details)
+            except Exception as e:
+                self.errors.append(e)
+
+        self.join(self.spawn(8, fetch))
+        self.assertEqual(self.errors, [])
+        self.assertEqual(self.failures, [])
+
+
+@unittest.skipIf(gevent is None, 'gevent is not installed')
+class GreenletStressTestCase(StressTests, unittest.TestCase):
+
+    def spawn(self, count, target):
+        return [gevent.spawn(target) for i in range(count)]
+
+    def join(self, workers):
+        gevent.joinall(workers, raise_error=True)
+
+    def pause(self):
+        gevent.sleep(0)
+
+    def switch(self):
+        gevent.sleep(0)
@@ -0,0 +1,108 @@
+"""\
+Tests for kt.problemdetails.reporting.
+
+"""
+
+import json
+import logging
+import unittest.mock
+
+import kt.problemdetails.api
+import kt.problemdetails.reporting
+import tests.utils
+
+
+class ReporterTestCase(tests.utils.ProblemDetailsTestCase):
+
+    def setUp(self):
+        super(ReporterTestCase, self).setUp()
+        self.reporter = kt.problemdetails.reporting.ProblemReporter(
+            redact=['whence'])
+        previous = kt.problemdetails.api.set_reporter(self.reporter)
+        self.addCleanup(kt.problemdetails.api.set_reporter, previous)
+
+    def render(self, error, render=kt.problemdetails.api.render_json):
+
+        @self.app.route('/foo')
+        def my_route():
+            return render(error)
+
+        return self.http_get('/foo', status=None)
+
+    def test_record_reuses_response_content(self):
+        error = tests.utils.SampleProblemDetails()
+
+        with self.assertLogs('kt.problemdetails.problems') as cm:
+            resp = self.render(error)
+
+        rec, = cm.records
+        self.assertEqual(rec.levelno, logging.INFO)
+        self.assertEqual(rec.getMessage(), 'problem 400: Evil is Coming')
+        self.assertIs(rec.problem.error, error)
+        self.assertEqual(rec.problem.status, 400)
+        self.assertEqual(rec.problem.content, resp.data)
+        self.assertEqual(rec.problem.content_type, 'application/problem+json')
+        self.assertEqual(json.loads(rec.problem.content), rec.problem.data)
+
+    def test_redacted_fields_not_sent_to_client(self):
+        error = tests.utils.SampleProblemDetails()
+
+        with self.assertLogs('kt.problemdetails.problems') as cm:
+            resp = self.render(error)
+
+        data = resp.get_json()
+        self.assertNotIn('whence', data)
+        self.assertEqual(data['severity'], 'really, really bad')
+        rec, = cm.records
+        self.assertEqual(rec.problem.private, {'whence': 'Depths of Hades'})
+        self.assertNotIn('whence', rec.problem.data)
+
+    def test_redacted_fields_not_sent_to_client_xml(self):
+        error = tests.utils.SampleProblemDetails()
+
+        with self.assertLogs('kt.problemdetails.problems') as cm:
+            resp = self.render(error, kt.problemdetails.api.render_xml)
+
+        self.assertNotIn(b'whence', resp.data)
+        self.assertIn(b'<severity>', resp.data)
+        rec, = cm.records
+        self.assertEqual(rec.problem.content, resp.data)
+        self.assertEqual(rec.problem.private, {'whence': 'Depths of Hades'})
+
+    def test_server_errors_always_logged(self):
+        self.reporter.client_error_rate = 0.0
+        error = tests.utils.SampleError('bad stuff happened')
+
+        with self.assertLogs('kt.problemdetails.problems') as cm:
+            self.render(error)
+
+        rec, = cm.records
+        self.assertEqual(rec.levelno, logging.ERROR)
+        self.assertEqual(rec.problem.status, 500)
+
+    def test_client_errors_sampled(self):
+        self.reporter.client_error_rate = 0.25
+        error = tests.utils.SampleProblemDetails()
+
+        with unittest.mock.patch('random.random', side_effect=[0.5, 0.1]):
+            with self.assertLogs('kt.problemdetails.problems') as cm:
+                self.render(error)
+                self.http_get('/foo', status=400)
+
+        rec, = cm.records
+        self.assertEqual(rec.problem.status, 400)
+
+    def test_reporter_failure_does_not_break_response(self):
+        error = tests.utils.SampleProblemDetails()
+        self.reporter.logger = None
+
+        with self.assertLogs('kt.problemdetails', logging.ERROR) as cm:
+            resp = self.render(error)
+
+        self.assertEqual(resp.status_code, 400)
+        rec, = cm.records
+        self.assertEqual(rec.getMessage(), 'problem reporter failed')
+
+    def test_invalid_sample_rate(self):
+        with self.assertRaises(ValueError):
+            kt.problemdetails.reporting.ProblemReporter(client_error_rate=2)
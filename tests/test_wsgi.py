@@ -0,0 +1,353 @@
+"""\
+Tests for kt.problemdetails.wsgi, using a local WSGI server.
+
+Set the ``KT_PROBLEMDETAILS_TIMING_REPORT`` environment variable to
+compare the cost of rendering through the middleware and through Flask,
+with results written to standard error.
+
+"""
+
+import http.client
+import io
+import json
+import logging
+import os
+import sys
+import threading
+import timeit
+import unittest
+import wsgiref.simple_server
+import wsgiref.util
+
+import flask
+import zope.interface
+
+import kt.problemdetails.api
+import kt.problemdetails.interfaces
+import kt.problemdetails.wsgi
+import tests.utils
+
+
+@zope.interface.implementer(kt.problemdetails.interfaces.IProblemDetails)
+class GoneError(Exception):
+
+    status = 410
+    title = 'Gone'
+    type = 'https://api.example.com/errors/gone'
+    instance = None
+
+    def __init__(self, detail):
+        super(GoneError, self).__init__(detail)
+        self.detail = detail
+        self.had_app_context = flask.has_app_context()
+
+    def extensions(self):
+        return dict(had_app_context=self.had_app_context)
+
+
+class QuietHandler(wsgiref.simple_server.WSGIRequestHandler):
+
+    def log_message(self, format, *args):
+        pass
+
+
+class WSGIServerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        super(WSGIServerTestCase, self).setUp()
+        self.app = None
+        self.closed = threading.Event()
+        middleware = kt.problemdetails.wsgi.ProblemDetailsMiddleware(
+            lambda environ, start_response: self.app(environ,
+                                                     start_response))
+        self.server = wsgiref.simple_server.make_server(
+            '127.0.0.1', 0, middleware, handler_class=QuietHandler)
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def http_get(self, path='/', accept=None):
+        conn = http.client.HTTPConnection('127.0.0.1', self.server.server_port)
+        self.addCleanup(conn.close)
+        headers = {} if accept is None else {'Accept': accept}
+        conn.request('GET', path, headers=headers)
+        resp = conn.getresponse()
+        return resp, resp.read()
+
+    def http_get_problem(self, path='/', accept=None):
+        with self.assertLogs('kt.problemdetails.wsgi') as cm:
+            resp, body = self.http_get(path, accept)
+        rec, = cm.records
+        self.assertEqual(rec.getMessage(),
+                         'uncaught exception in WSGI application')
+        return resp, body
+
+    def test_success_passed_through(self):
+
+        def app(environ, start_response):
+            start_response('200 OK', [('Content-Type', 'text/plain')])
+            return Body([b'all ', b'good'], self)
+
+        self.app = app
+        resp, body = self.http_get()
+
+        self.assertEqual(resp.status, 200)
+        self.assertEqual(body, b'all good')
+        self.assertTrue(self.closed.wait(5))
+
+    def test_content_length_kept(self):
+
+        def app(environ, start_response):
+            start_response('200 OK', [('Content-Type', 'text/plain')])
+            return [b'hello']
+
+        self.app = app
+        resp, body = self.http_get()
+
+        self.assertEqual(resp.status, 200)
+        self.assertEqual(resp.getheader('Content-Length'), '5')
+        self.assertEqual(body, b'hello')
+
+    def test_file_wrapper_passed_through(self):
+
+        def app(environ, start_response):
+            start_response('200 OK', [('Content-Type', 'text/plain')])
+            return environ['wsgi.file_wrapper'](io.BytesIO(b'from a file'))
+
+        self.app = app
+        resp, body = self.http_get()
+
+        self.assertEqual(resp.status, 200)
+        self.assertEqual(body, b'from a file')
+
+    def test_generator_body(self):
+
+        def app(environ, start_response):
+            start_response('200 OK', [('Content-Type', 'text/plain')])
+            yield b'one, '
+            yield b'two'
+
+        self.app = app
+        resp, body = self.http_get()
+
+        self.assertEqual(resp.status, 200)
+        self.assertEqual(body, b'one, two')
+
+    def test_empty_body(self):
+
+        def app(environ, start_response):
+            start_response('204 No Content', [])
+            return Body([], self)
+
+        self.app = app
+        resp, body = self.http_get()
+
+        self.assertEqual(resp.status, 204)
+        self.assertEqual(body, b'')
+        self.assertTrue(self.closed.wait(5))
+
+    def test_exception_from_app(self):
+
+        def app(environ, start_response):
+            raise tests.utils.SampleError('bad stuff happened')
+
+        self.app = app
+        resp, body = self.http_get_problem()
+
+        self.assertEqual(resp.status, 500)
+        self.assertEqual(resp.reason, 'Internal Server Error')
+        self.assertEqual(resp.getheader('Content-Type'),
+                         'application/problem+json')
+        self.assertEqual(int(resp.getheader('Content-Length')), len(body))
+        self.assertEqual(json.loads(body), dict(
+            detail='bad stuff happened',
+            status=500,
+            title='Something evil this way comes.',
+        ))
+
+    def test_exception_from_body_iteration(self):
+
+        def app(environ, start_response):
+            start_response('200 OK', [('Content-Type', 'text/plain')])
+            raise GoneError('Long gone.')
+            yield b'never'
+
+        self.app = app
+        resp, body = self.http_get_problem()
+
+        self.assertEqual(resp.status, 410)
+        data = json.loads(body)
+        self.assertEqual(data['detail'], 'Long gone.')
+        self.assertEqual(data['type'], 'https://api.example.com/errors/gone')
+
+    def test_xml_preferred(self):
+
+        def app(environ, start_response):
+            raise GoneError('Long gone.')
+
+        self.app = app
+        resp, body = self.http_get_problem(
+            accept='application/problem+xml, application/json;q=0.5')
+
+        self.assertEqual(resp.status, 410)
+        self.assertEqual(resp.getheader('Content-Type'),
+                         'application/problem+xml')
+        self.assertEqual(
+            body.decode('utf-8'),
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<problem xmlns="urn:ietf:rfc:7807">\n'
+            '  <type>https://api.example.com/errors/gone</type>\n'
+            '  <title>Gone</title>\n'
+            '  <status>410</status>\n'
+            '  <detail>Long gone.</detail>\n'
+            '\n'
+            '  <had_app_context>False</had_app_context>\n'
+            '</problem>\n'
+        )
+
+    def test_quality_values_respected(self):
+
+        def app(environ, start_response):
+            raise GoneError('Long gone.')
+
+        self.app = app
+        resp, body = self.http_get_problem(
+            accept='application/json;q=0.1, application/problem+xml')
+
+        self.assertEqual(resp.getheader('Content-Type'),
+                         'application/problem+xml')
+
+    def test_json_when_no_preference(self):
+
+        def app(environ, start_response):
+            raise GoneError('Long gone.')
+
+        self.app = app
+        resp, body = self.http_get_problem(accept='text/html, */*;q=0.1')
+
+        self.assertEqual(resp.getheader('Content-Type'),
+                         'application/problem+json')
+
+    def test_flask_app_errors_rendered_without_flask(self):
+        app = flask.Flask(__name__)
+        app.config['PROPAGATE_EXCEPTIONS'] = True
+
+        @app.route('/foo')
+        def my_route():
+            raise GoneError('Long gone.')
+
+        self.app = app
+        resp, body = self.http_get_problem('/foo')
+
+        self.assertEqual(resp.status, 410)
+        data = json.loads(body)
+        self.assertEqual(data['detail'], 'Long gone.')
+        # The exception was raised in Flask, but rendered outside.
+        self.assertTrue(data['had_app_context'])
+
+    def test_unknown_status(self):
+
+        @zope.interface.implementer(
+            kt.problemdetails.interfaces.IProblemDetails)
+        class OddError(Exception):
+            status = 499
+            title = type = detail = instance = None
+
+            def extensions(self):
+                return {}
+
+        def app(environ, start_response):
+            raise OddError()
+
+        self.app = app
+        resp, body = self.http_get_problem()
+
+        self.assertEqual(resp.status, 499)
+        self.assertEqual(resp.reason, 'Unknown')
+
+
+class PassThroughTestCase(unittest.TestCase):
+
+    def test_file_wrapper_returned_unchanged(self):
+        result = wsgiref.util.FileWrapper(io.BytesIO(b'data'))
+        middleware = kt.problemdetails.wsgi.ProblemDetailsMiddleware(
+            lambda environ, start_response: result)
+
+        environ = {'wsgi.file_wrapper': wsgiref.util.FileWrapper}
+        self.assertIs(middleware(environ, None), result)
+
+    def test_list_returned_unchanged(self):
+        result = [b'data']
+        middleware = kt.problemdetails.wsgi.ProblemDetailsMiddleware(
+            lambda environ, start_response: result)
+
+        self.assertIs(middleware({}, None), result)
+
+
+@unittest.skipUnless(os.environ.get('KT_PROBLEMDETAILS_TIMING_REPORT'),
+                     'KT_PROBLEMDETAILS_TIMING_REPORT is not set')
+class TimingTestCase(unittest.TestCase):
+
+    iterations = 10000
+
+    def setUp(self):
+        # Rendering is logged in both cases; keep that out of the output.
+        logging.disable(logging.CRITICAL)
+        self.addCleanup(logging.disable, logging.NOTSET)
+
+    def time_app(self, app):
+        def request():
+            environ = {}
+            wsgiref.util.setup_testing_defaults(environ)
+            body = app(environ, lambda status, headers, exc_info=None: None)
+            b''.join(body)
+            _close(body)
+
+        request()
+        seconds = timeit.timeit(request, number=self.iterations)
+        return seconds / self.iterations * 1e6
+
+    def test_middleware_lighter_than_flask(self):
+
+        def app(environ, start_response):
+            raise tests.utils.SampleError('bad stuff happened')
+
+        middleware = kt.problemdetails.wsgi.ProblemDetailsMiddleware(app)
+
+        flask_app = flask.Flask(__name__)
+
+        @flask_app.route('/')
+        def my_route():
+            raise tests.utils.SampleError('bad stuff happened')
+
+        @flask_app.errorhandler(tests.utils.SampleError)
+        def handle(error):
+            return kt.problemdetails.api.render_json(error)
+
+        middleware_us = self.time_app(middleware)
+        flask_us = self.time_app(flask_app.wsgi_app)
+        print(f'\nunadapted exception rendered via middleware:'
+              f' {middleware_us:8.1f} us/request\n'
+              f'unadapted exception rendered via Flask:'
+              f'      {flask_us:8.1f} us/request',
+              file=sys.stderr)
+        self.assertLess(middleware_us, flask_us)
+
+
+def _close(body):
+    close = getattr(body, 'close', None)
+    if close is not None:
+        close()
+
+
+class Body(list):
+
+    def __init__(self, items, testcase):
+        super(Body, self).__init__(items)
+        self.testcase = testcase
+
+    def close(self):
+        self.testcase.closed.set()